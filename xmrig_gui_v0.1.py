@@ -1,33 +1,152 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import functools
 import json
+import os
+import shlex
 import subprocess
+import threading
+
+
+# Dropdown choices; the first entry is the default
+_ALGO_CHOICES = (
+    "gr", "rx/graft", "cn/upx2", "argon2/chukwav2", "cn/ccx", "kawpow", "rx/keva",
+    "cn-pico/tlo", "rx/sfx", "rx/arq", "rx/0", "argon2/chukwa", "argon2/ninja", "rx/wow",
+    "cn/fast", "cn/rwz", "cn/zls", "cn/double", "cn/r", "cn-pico", "cn/half", "cn/2",
+    "cn/xao", "cn/rto", "cn-heavy/tube", "cn-heavy/xhv", "cn-heavy/0", "cn/1",
+    "cn-lite/1", "cn-lite/0", "cn/0",
+)
+_ASM_CHOICES = ("auto", "none", "intel", "ryzen", "bulldozer")
+_ARGON2_IMPL_CHOICES = ("x86_64", "SSE2", "SSSE3", "XOP", "AVX2", "AVX-512F")
+_RANDOMX_MODE_CHOICES = ("auto", "fast", "light")
+
+# Values XMRig picks by itself when the option isn't given, so there's no need to pass them
+_XMRIG_DEFAULTS = {"asm": "auto", "randomx-mode": "auto", "http-host": "127.0.0.1"}
+
+# Parameter files carrying this "_version" leave out values at their default; older ones
+# left out cleared fields, so a missing key there means blank
+_SETTINGS_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def _usable_cpus():
+    """CPUs this process may run on, falling back to all CPUs where affinity isn't available."""
+    try:
+        return frozenset(os.sched_getaffinity(0))
+    except AttributeError:
+        return frozenset(range(os.cpu_count() or 1))
+
+
+def _default_threads():
+    return str(len(_usable_cpus()))
+
+
+def _default_cpu_affinity():
+    cpus = _usable_cpus()
+    if max(cpus) >= 64:
+        return ""  # XMRig reads a 64-bit mask; leave it blank and let XMRig decide
+    return hex(sum(1 << cpu for cpu in cpus))
+
+
+# Entry defaults may be callables, evaluated when the widget is built
+_NETWORK_OPTIONS = (
+    ("URL", "-o", "url", "stratum+tcp://randomxmonero.auto.nicehash.com:9200"),
+    ("Coin", "--coin", "coin"),
+    ("Username", "-u", "user", "38bj4uu8uDsnC5NjoeGb8TMviBCEtMiaet"),
+    ("Password", "-p", "pass"),
+    ("Userpass", "-O", "userpass"),
+    ("Proxy", "-x", "proxy"),
+    ("Keepalive", "-k", "keepalive", "checkbox"),
+    ("Nicehash", "--nicehash", "nicehash", "checkbox"),
+    ("Rig ID", "--rig-id", "rig-id"),
+    ("Algorithm", "-a", "algo", "dropdown", _ALGO_CHOICES),
+)
+
+_CPU_OPTIONS = (
+    ("Disable CPU", "--no-cpu", "no-cpu", "checkbox"),
+    ("Threads", "-t", "threads", _default_threads),
+    ("CPU Affinity", "--cpu-affinity", "cpu-affinity", _default_cpu_affinity),
+    ("Algorithm Variation", "-v", "av"),
+    ("CPU Priority", "--cpu-priority", "cpu-priority"),
+    ("Max Threads Hint", "--cpu-max-threads-hint", "cpu-max-threads-hint"),
+    ("CPU Memory Pool", "--cpu-memory-pool", "cpu-memory-pool"),
+    ("CPU No Yield", "--cpu-no-yield", "cpu-no-yield", "checkbox"),
+    ("No Huge Pages", "--no-huge-pages", "no-huge-pages", "checkbox"),
+    ("Huge Page Size", "--hugepage-size", "hugepage-size"),
+    ("Huge Pages JIT", "--huge-pages-jit", "huge-pages-jit", "checkbox"),
+    ("ASM Optimizations", "--asm", "asm", "dropdown", _ASM_CHOICES),
+    ("Argon2 Implementation", "--argon2-impl", "argon2-impl", "dropdown", _ARGON2_IMPL_CHOICES),
+    ("RandomX Init", "--randomx-init", "randomx-init"),
+    ("RandomX No NUMA", "--randomx-no-numa", "randomx-no-numa", "checkbox"),
+    ("RandomX Mode", "--randomx-mode", "randomx-mode", "dropdown", _RANDOMX_MODE_CHOICES),
+    ("RandomX 1GB Pages", "--randomx-1gb-pages", "randomx-1gb-pages", "checkbox"),
+    ("RandomX MSR", "--randomx-wrmsr", "randomx-wrmsr"),
+    ("RandomX No RDMSR", "--randomx-no-rdmsr", "randomx-no-rdmsr", "checkbox"),
+    ("RandomX Cache QoS", "--randomx-cache-qos", "randomx-cache-qos", "checkbox"),
+)
+
+_API_OPTIONS = (
+    ("Worker ID", "--api-worker-id", "api-worker-id"),
+    ("Instance ID", "--api-id", "api-id"),
+    ("Host", "--http-host", "http-host", "127.0.0.1"),
+    ("Port", "--http-port", "http-port"),
+    ("Access Token", "--http-access-token", "http-access-token"),
+    ("No Restricted", "--http-no-restricted", "http-no-restricted", "checkbox"),
+)
+
+_TLS_OPTIONS = (
+    ("TLS Gen", "--tls-gen", "tls-gen"),
+)
+
+_LOGGING_OPTIONS = (
+    ("Syslog", "-S", "syslog", "checkbox"),
+)
+
+_MISC_OPTIONS = ()  # Removed the config file option
+
+
+# Write a widget's Tk variable by the kind tagged on it in add_options
+_SETTERS = {
+    "entry": lambda var, v: var.set(v),
+    "check": lambda var, v: var.set(int(v) if v else 0),  # Default to 0 if empty
+    "combo": lambda var, v: var.set(v) if v else None,  # Keep the current value if empty
+}
 
 
 class XMRigGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("XMRig GUI")
+
+        # Shared styles for the option inputs, configured once
+        style = ttk.Style(root)
+        style.configure("XM.TEntry", padding=2)
+        style.configure("XM.TCombobox", padding=2)
+
         self.settings = {}
-        self.network_entries = {}
-        self.cpu_entries = {}
-        self.api_entries = {}
-        self.tls_entries = {}
-        self.logging_entries = {}
-        self.misc_entries = {}
+        self._values = {}  # Mirror of every widget's value, kept current by Tcl traces
+        self._defaults = {}  # Value each widget starts with
+        self._settings_cache = None  # Last parsed parameter file, valid while its stat stamp is unchanged
+        self._settings_stamp = None
+        self.entries = {}  # (kind, Tk variable) for every option, across all tabs
         self.process = None
+        self._launching = False
 
         # Notebook for tabs
         notebook = ttk.Notebook(root)
         notebook.pack(fill="both", expand=True)
+        self.notebook = notebook
 
-        # Add tabs
-        self.add_tab(notebook, "Network", self.network_entries, self.network_options())
-        self.add_tab(notebook, "CPU Backend", self.cpu_entries, self.cpu_options())
-        self.add_tab(notebook, "API", self.api_entries, self.api_options())
-        self.add_tab(notebook, "TLS", self.tls_entries, self.tls_options())
-        self.add_tab(notebook, "Logging", self.logging_entries, self.logging_options())
-        self.add_tab(notebook, "Misc", self.misc_entries, self.misc_options())
+        # Add empty tabs; their widgets are built the first time they are selected
+        self._tab_specs = []
+        self.add_tab(notebook, "Network", self.network_options)
+        self.add_tab(notebook, "CPU Backend", self.cpu_options)
+        self.add_tab(notebook, "API", self.api_options)
+        self.add_tab(notebook, "TLS", self.tls_options)
+        self.add_tab(notebook, "Logging", self.logging_options)
+        self.add_tab(notebook, "Misc", self.misc_options)
+        notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+        self._build_tab(notebook.index(notebook.select()))
 
         # Control buttons
         buttons_frame = tk.Frame(root)
@@ -38,179 +157,235 @@ class XMRigGUI:
         tk.Button(buttons_frame, text="Run XMRig", command=self.run_xmrig).pack(side="left", padx=5)
         tk.Button(buttons_frame, text="Stop XMRig", command=self.stop_xmrig).pack(side="left", padx=5)
 
-    def add_tab(self, notebook, tab_name, entries, options):
-        """Add a tab with options."""
+        # Status bar for routine feedback that shouldn't block the GUI with a dialog
+        self.status = ttk.Label(root, anchor="w")
+        self.status.pack(fill="x", side="bottom")
+        self._status_after = None
+
+    def add_tab(self, notebook, tab_name, options):
+        """Add an empty tab whose options are built on first selection."""
         tab = ttk.Frame(notebook)
         notebook.add(tab, text=tab_name)
-        self.add_options(tab, entries, options)
+        self._tab_specs.append([tab, options, False])
+
+    def _build_tab(self, index):
+        """Build the options of a tab if that has not been done yet."""
+        spec = self._tab_specs[index]
+        tab, options, built = spec
+        if built:
+            return
+        self.add_options(tab, options())
+        spec[2] = True
 
-    def add_options(self, tab, entries, options):
+    def _build_all_tabs(self):
+        """Build every tab so all widgets can be read or written."""
+        for index in range(len(self._tab_specs)):
+            self._build_tab(index)
+
+    def _on_tab_changed(self, event):
+        """Build the newly selected tab on demand."""
+        self._build_tab(self.notebook.index(self.notebook.select()))
+
+    def add_options(self, tab, options):
         """Add options to a given tab."""
+        # Hold off geometry propagation until every row is placed, then lay the tab out once
+        tab.grid_propagate(False)
         for row, (label_text, param, key, *widget_type) in enumerate(options):
-            tk.Label(tab, text=label_text).grid(row=row, column=0, sticky="w", padx=5, pady=2)
+            label = tk.Label(tab, text=label_text)
+            sticky = ""
             if widget_type and widget_type[0] == "checkbox":
                 var = tk.IntVar(value=0)  # Ensure all checkboxes are unchecked initially
-                checkbox = tk.Checkbutton(tab, variable=var)
-                checkbox.grid(row=row, column=1, sticky="w", padx=5, pady=2)
-                entries[key] = var
+                widget = tk.Checkbutton(tab, variable=var)
+                sticky = "w"
+                self.entries[key] = ("check", var)
             elif widget_type and widget_type[0] == "dropdown":
                 choices = widget_type[1]
-                combobox = ttk.Combobox(tab, values=choices, state="readonly", width=37)
-                combobox.set(choices[0])  # Default to the first choice
-                combobox.grid(row=row, column=1, padx=5, pady=2)
-                entries[key] = combobox
+                var = tk.StringVar(value=choices[0])  # Default to the first choice
+                widget = ttk.Combobox(tab, values=choices, state="readonly", style="XM.TCombobox", width=37, textvariable=var)
+                self.entries[key] = ("combo", var)
             else:
-                entry = tk.Entry(tab, width=40)
                 default_value = widget_type[0] if widget_type else ""  # Set default value if provided
-                entry.insert(0, default_value)
-                entry.grid(row=row, column=1, padx=5, pady=2)
-                entries[key] = entry
+                if callable(default_value):
+                    default_value = default_value()
+                var = tk.StringVar(value=default_value)
+                widget = ttk.Entry(tab, style="XM.TEntry", width=40, textvariable=var)
+                self.entries[key] = ("entry", var)
+            self._defaults[key] = var.get()
+            self._track(key, var)
+            label.grid(row=row, column=0, sticky="w", padx=5, pady=2)
+            widget.grid(row=row, column=1, sticky=sticky, padx=5, pady=2)
+        tab.grid_propagate(True)
+        tab.update_idletasks()
+
+    def _track(self, key, var):
+        """Mirror a Tk variable into self._values whenever it is written."""
+        self._values[key] = var.get()
+        var.trace_add("write", lambda *_: self._values.__setitem__(key, var.get()))
 
     def update_ui_with_settings(self):
         """Update the UI with loaded settings."""
-        for tab_entries in [self.network_entries, self.cpu_entries, self.api_entries, self.tls_entries, self.logging_entries, self.misc_entries]:
-            for key, widget in tab_entries.items():
-                value = self.settings.get(key, "")
-                if isinstance(widget, tk.Entry):
-                    widget.delete(0, tk.END)
-                    widget.insert(0, value)
-                elif isinstance(widget, tk.IntVar):
-                    # Ensure we handle checkbox values properly
-                    widget.set(int(value) if value else 0)  # Default to 0 if empty
-                elif isinstance(widget, ttk.Combobox):
-                    widget.set(value if value else widget.get())  # Set to the current value if empty
+        self._build_all_tabs()
+        for key, value in self.settings.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                continue  # Not a parameter used in this program
+            kind, var = entry
+            _SETTERS[kind](var, value)
+
+        # Put back only the unsaved widgets that were changed
+        versioned = "_version" in self.settings
+        for key, default in self._defaults.items():
+            if key in self.settings:
+                continue
+            value = default if versioned else ""
+            if self._values[key] != value:
+                kind, var = self.entries[key]
+                _SETTERS[kind](var, value)
 
     def save_settings(self):
         """Save settings to a file, but only include parameters used in this program."""
-        self.settings = {}
-        for key, entry in {**self.network_entries, **self.cpu_entries, **self.api_entries, **self.tls_entries, **self.logging_entries, **self.misc_entries}.items():
-            value = entry.get() if isinstance(entry, (tk.Entry, ttk.Combobox)) else entry.get()
-            
-            # Handle the case where the value is empty
+        self._build_all_tabs()
+        self.settings = {"_version": _SETTINGS_VERSION}
+        for key, value in self._values.items():
+            default = self._defaults[key]
+            if value == default:
+                continue  # Skip values left at their default
+
+            # Skip empty string values, unless a prefilled field was cleared on purpose
             if isinstance(value, str) and value.strip() == "":
-                continue  # Skip empty string values
-            
+                if not default:
+                    continue
+                value = ""
+
             # Save the value to settings
             self.settings[key] = value
         
-        with open("xmrig_parameters.json", "w") as f:
-            json.dump(self.settings, f, indent=4)
+        # Serialize up front and swap the file in so a killed GUI never leaves it half-written
+        data = json.dumps(self.settings, indent=4)
+        tmp = "xmrig_parameters.json.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, "xmrig_parameters.json")
 
     def load_settings(self):
         """Load settings from a file."""
         try:
-            with open("xmrig_parameters.json", "r") as f:
-                self.settings = json.load(f)
+            st = os.stat("xmrig_parameters.json")
+            # Size and inode catch replacements that keep the mtime (cp -p, rsync -t, os.replace)
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if self._settings_cache is None or stamp != self._settings_stamp:
+                with open("xmrig_parameters.json", "r") as f:
+                    self._settings_cache = json.load(f)
+                self._settings_stamp = stamp
+            self.settings = dict(self._settings_cache)
             self.update_ui_with_settings()
         except FileNotFoundError:
-            messagebox.showerror("Error", "No parameter file found.")
+            self._set_status("No parameter file found.")
+        except ValueError as e:  # Malformed JSON or text encoding
+            messagebox.showerror("Error", f"Could not read the parameter file: {e}")
 
     def run_xmrig(self):
         """Run XMRig with current settings in mate-terminal, without using the -c flag."""
-        if self.process and self.process.poll() is None:  # If XMRig is already running
-            messagebox.showwarning("Warning", "XMRig is already running.")
+        if self._launching or (self.process and self.process.poll() is None):  # If XMRig is already running
+            self._set_status("XMRig is already running.", timeout=3000)
             return
 
-        command = ["./xmrig"]
+        self._build_all_tabs()
+        command = ["./xmrig", *self._iter_argv()]
 
-        # Collect settings and add to command
-        for key, widget in {**self.network_entries, **self.cpu_entries, **self.api_entries, **self.tls_entries, **self.logging_entries, **self.misc_entries}.items():
-            value = widget.get() if isinstance(widget, tk.Entry) else widget.get()
+        # Spawn off the Tk thread so a slow mate-terminal start doesn't freeze the GUI
+        self._launching = True
+        threading.Thread(target=self._spawn_xmrig, args=(command,), daemon=True).start()
 
-            if isinstance(widget, tk.IntVar) and value:  # For checkboxes only if checked
-                command.append(f"--{key}")
-            elif value:  # For other widget types
-                command.append(f"--{key}={value}")
+    def _iter_argv(self):
+        """Yield an XMRig argument for each option that is set."""
+        for key, (kind, _) in self.entries.items():
+            value = self._values[key]
+            if kind == "check":
+                if value:  # For checkboxes only if checked
+                    yield f"--{key}"
+            elif value and value != _XMRIG_DEFAULTS.get(key):  # e.g. no --asm=auto
+                yield f"--{key}={value}"
 
-        # Start xmrig in mate-terminal
+    def _spawn_xmrig(self, command):
+        """Start xmrig in mate-terminal from a worker thread and hand the result back to Tk."""
+        # Quote each argument and keep the shell open afterwards. --disable-factory gives this window
+        # its own mate-terminal process instead of handing it to a shared one and exiting, so the
+        # process we track lives exactly as long as the XMRig window and signalling it touches no other
+        process, error = None, None
         try:
-            self.process = subprocess.Popen([
-                "mate-terminal", "--", "bash", "-c", " ".join(command) + "; exec bash"
+            process = subprocess.Popen([
+                "mate-terminal", "--disable-factory", "--", "bash", "-c", shlex.join(command) + "; exec bash"
             ])
         except FileNotFoundError:
-            messagebox.showerror("Error", "mate-terminal is not installed or not found.")
+            error = "mate-terminal is not installed or not found."
+        except OSError as e:
+            error = f"Could not start mate-terminal: {e}"
+        self.root.after(0, self._on_xmrig_spawned, process, error)
+
+    def _on_xmrig_spawned(self, process, error):
+        """Record the spawned process on the Tk thread."""
+        self._launching = False
+        if error is not None:
+            messagebox.showerror("Error", error)
+            return
+        self.process = process
+        self.root.after(500, self._poll_process, process)
+
+    def _poll_process(self, process):
+        """Reap the XMRig terminal once it has exited, checking again later while it runs."""
+        if process.poll() is None:
+            self.root.after(500, self._poll_process, process)
+        elif self.process is process:
+            self.process = None
+            self._set_status("XMRig terminal closed.")
 
     def stop_xmrig(self):
-        """Stop the running XMRig process."""
+        """Stop the running XMRig process by closing its terminal."""
         if self.process:
-            self.process.terminate()  # Terminate the process gracefully
-            self.process = None
-            messagebox.showinfo("Info", "XMRig stopped.")
+            # Terminate the process gracefully; _poll_process clears self.process once it has actually exited
+            process = self.process
+            process.terminate()
+            self.root.after(3000, lambda: process.poll() is None and process.kill())
+            self._set_status("Closing XMRig terminal...")
         else:
-            messagebox.showwarning("Warning", "XMRig is not running.")
+            self._set_status("XMRig is not running.", timeout=3000)
+
+    def _set_status(self, text, timeout=5000):
+        """Show a transient message in the status bar."""
+        if self._status_after is not None:
+            self.root.after_cancel(self._status_after)
+        self.status.config(text=text)
+        self._status_after = self.root.after(timeout, self._clear_status)
+
+    def _clear_status(self):
+        """Empty the status bar."""
+        self._status_after = None
+        self.status.config(text="")
 
     @staticmethod
     def network_options():
-        return [
-            ("URL", "-o", "url", "stratum+tcp://randomxmonero.auto.nicehash.com:9200"),
-            ("Coin", "--coin", "coin"),
-            ("Username", "-u", "user", "38bj4uu8uDsnC5NjoeGb8TMviBCEtMiaet"),
-            ("Password", "-p", "pass"),
-            ("Userpass", "-O", "userpass"),
-            ("Proxy", "-x", "proxy"),
-            ("Keepalive", "-k", "keepalive", "checkbox"),
-            ("Nicehash", "--nicehash", "nicehash", "checkbox"),
-            ("Rig ID", "--rig-id", "rig-id"),
-            ("Algorithm", "-a", "algo", "dropdown", [
-                "gr", "rx/graft", "cn/upx2", "argon2/chukwav2", "cn/ccx", "kawpow", "rx/keva", 
-                "cn-pico/tlo", "rx/sfx", "rx/arq", "rx/0", "argon2/chukwa", "argon2/ninja", "rx/wow", 
-                "cn/fast", "cn/rwz", "cn/zls", "cn/double", "cn/r", "cn-pico", "cn/half", "cn/2", 
-                "cn/xao", "cn/rto", "cn-heavy/tube", "cn-heavy/xhv", "cn-heavy/0", "cn/1", 
-                "cn-lite/1", "cn-lite/0", "cn/0"
-            ]),
-        ]
+        return _NETWORK_OPTIONS
 
     @staticmethod
     def cpu_options():
-        return [
-            ("Disable CPU", "--no-cpu", "no-cpu", "checkbox"),
-            ("Threads", "-t", "threads"),
-            ("CPU Affinity", "--cpu-affinity", "cpu-affinity"),
-            ("Algorithm Variation", "-v", "av"),
-            ("CPU Priority", "--cpu-priority", "cpu-priority"),
-            ("Max Threads Hint", "--cpu-max-threads-hint", "cpu-max-threads-hint"),
-            ("CPU Memory Pool", "--cpu-memory-pool", "cpu-memory-pool"),
-            ("CPU No Yield", "--cpu-no-yield", "cpu-no-yield", "checkbox"),
-            ("No Huge Pages", "--no-huge-pages", "no-huge-pages", "checkbox"),
-            ("Huge Page Size", "--hugepage-size", "hugepage-size"),
-            ("Huge Pages JIT", "--huge-pages-jit", "huge-pages-jit", "checkbox"),
-            ("ASM Optimizations", "--asm", "asm", "dropdown", ["auto", "none", "intel", "ryzen", "bulldozer"]),
-            ("Argon2 Implementation", "--argon2-impl", "argon2-impl", "dropdown", ["x86_64", "SSE2", "SSSE3", "XOP", "AVX2", "AVX-512F"]),
-            ("RandomX Init", "--randomx-init", "randomx-init"),
-            ("RandomX No NUMA", "--randomx-no-numa", "randomx-no-numa", "checkbox"),
-            ("RandomX Mode", "--randomx-mode", "randomx-mode", "dropdown", ["auto", "fast", "light"]),
-            ("RandomX 1GB Pages", "--randomx-1gb-pages", "randomx-1gb-pages", "checkbox"),
-            ("RandomX MSR", "--randomx-wrmsr", "randomx-wrmsr"),
-            ("RandomX No RDMSR", "--randomx-no-rdmsr", "randomx-no-rdmsr", "checkbox"),
-            ("RandomX Cache QoS", "--randomx-cache-qos", "randomx-cache-qos", "checkbox"),
-        ]
+        return _CPU_OPTIONS
 
     @staticmethod
     def api_options():
-        return [
-            ("Worker ID", "--api-worker-id", "api-worker-id"),
-            ("Instance ID", "--api-id", "api-id"),
-            ("Host", "--http-host", "http-host", "127.0.0.1"),
-            ("Port", "--http-port", "http-port"),
-            ("Access Token", "--http-access-token", "http-access-token"),
-            ("No Restricted", "--http-no-restricted", "http-no-restricted", "checkbox"),
-        ]
+        return _API_OPTIONS
 
     @staticmethod
     def tls_options():
-        return [
-            ("TLS Gen", "--tls-gen", "tls-gen"),
-        ]
+        return _TLS_OPTIONS
 
     @staticmethod
     def logging_options():
-        return [
-            ("Syslog", "-S", "syslog", "checkbox"),
-        ]
+        return _LOGGING_OPTIONS
 
     @staticmethod
     def misc_options():
-        return []  # Removed the config file option
+        return _MISC_OPTIONS
 
 
 if __name__ == "__main__":